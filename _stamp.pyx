@@ -0,0 +1,68 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Cython build of the tool stamping kernels in nc2image.py.
+
+nc2image.py uses these instead of the Numba versions if this module has been
+compiled, which avoids Numba's JIT compile each time the program starts:
+
+    CFLAGS="-O3 -march=native -fopenmp" LDFLAGS="-fopenmp" cythonize -3 -i _stamp.pyx
+
+Without -fopenmp it still works, but on one CPU core.
+"""
+from cython.parallel import prange
+
+
+def stamp_interior(short[:, ::1] material, short[:, ::1] tool, int[::1] xs_px, int[::1] ys_px,
+                   int[::1] zs, Py_ssize_t[::1] row_offsets):
+    """
+    Apply the tool to the material at every sample point, where the whole tool fits
+    inside the material. See stamp_interior in nc2image.py.
+    """
+    cdef Py_ssize_t tool_size = tool.shape[0]
+    cdef Py_ssize_t half_tool = tool_size // 2
+    cdef Py_ssize_t n_tile_rows = row_offsets.shape[0] - 1
+    cdef Py_ssize_t parity, r, tile_row, k, i, j, x_start, y_start
+    cdef int z_value, v
+
+    for parity in range(2):
+        for r in prange((n_tile_rows - parity + 1) // 2, nogil=True, schedule='dynamic'):
+            tile_row = 2 * r + parity
+            for k in range(row_offsets[tile_row], row_offsets[tile_row + 1]):
+                x_start = xs_px[k] - half_tool
+                y_start = ys_px[k] - half_tool
+                z_value = zs[k]
+                for i in range(tool_size):
+                    for j in range(tool_size):
+                        v = tool[i, j] + z_value
+                        if v < material[x_start + i, y_start + j]:
+                            material[x_start + i, y_start + j] = <short>v
+
+
+def stamp_boundary(short[:, ::1] material, short[:, ::1] tool, int[::1] xs_px, int[::1] ys_px,
+                   int[::1] zs):
+    """
+    Apply the tool at sample points near the edge of the material, clipping the tool
+    to the material. See stamp_boundary in nc2image.py.
+    """
+    cdef Py_ssize_t width = material.shape[0]
+    cdef Py_ssize_t height = material.shape[1]
+    cdef Py_ssize_t half_tool = tool.shape[0] // 2
+    cdef Py_ssize_t k, i, j, x_px, y_px, x_start, x_end, y_start, y_end
+    cdef int z_value, v
+
+    for k in range(zs.shape[0]):
+        x_px = xs_px[k]
+        y_px = ys_px[k]
+
+        # Clip the tool footprint to the material
+        x_start = max(0, x_px - half_tool)
+        x_end = min(width, x_px + half_tool + 1)
+        y_start = max(0, y_px - half_tool)
+        y_end = min(height, y_px + half_tool + 1)
+
+        z_value = zs[k]
+        for i in range(x_start, x_end):
+            for j in range(y_start, y_end):
+                v = tool[i - x_px + half_tool, j - y_px + half_tool] + z_value
+                if v < material[i, j]:
+                    material[i, j] = <short>v
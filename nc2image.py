@@ -1,7 +1,35 @@
 import numpy as np
 from tqdm import tqdm
 import re
-from PIL import Image, ImageDraw
+import math
+import os
+import hashlib
+import functools
+from PIL import Image
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:  # Numba is optional, fall back to apply_tool for each step
+    numba = None
+    def njit(*args, **kwargs):
+        return lambda func: func
+    prange = range
+
+try:
+    import cupy
+    if not cupy.cuda.is_available():
+        cupy = None
+except ImportError:  # CuPy is optional, used to simulate on an NVIDIA GPU
+    cupy = None
+
+TWO_PI = 2 * math.pi
+
+# Tools at least this many pixels across are cached on disk by load_tool; smaller
+# ones are quicker to compute than to load. Bump the version whenever
+# initialize_tool's output changes, so old cache files are not used
+TOOL_CACHE_MIN_SIZE = 256
+TOOL_CACHE_VERSION = 1
 
 def generate_arc_points(x_start, y_start, x_end, y_end, x_center, y_center, clockwise=True, interpolation_distance=0.2):
     """
@@ -15,43 +43,45 @@ def generate_arc_points(x_start, y_start, x_end, y_end, x_center, y_center, cloc
         interpolation_distance: Desired distance between interpolated points in mm.
 
     Returns:
-        List of tuples (x, y) representing the interpolated points along the arc.
+        Array of shape (num_steps + 1, 2) holding the (x, y) interpolated points along the arc.
     """
     # Calculate the radius of the arc
-    radius = np.sqrt((x_start - x_center)**2 + (y_start - y_center)**2)
+    # (using math rather than NumPy for scalars, to avoid NumPy's per-call overhead)
+    radius = math.hypot(x_start - x_center, y_start - y_center)
 
     # Calculate start and end angles
-    start_angle = np.arctan2(y_start - y_center, x_start - x_center)
+    start_angle = math.atan2(y_start - y_center, x_start - x_center)
     if x_end is None or y_end is None \
     or (x_start == x_end and y_start == y_end):
-        end_angle = start_angle - (2 * np.pi if clockwise else -2 * np.pi)
+        end_angle = start_angle - (TWO_PI if clockwise else -TWO_PI)
     else:
-        end_angle = np.arctan2(y_end - y_center, x_end - x_center)
+        end_angle = math.atan2(y_end - y_center, x_end - x_center)
 
     # Ensure the angles cover the correct rotation direction
     if clockwise and end_angle > start_angle:
-        end_angle -= 2 * np.pi
+        end_angle -= TWO_PI
     elif not clockwise and end_angle < start_angle:
-        end_angle += 2 * np.pi
+        end_angle += TWO_PI
 
     # Calculate the arc length and number of interpolation steps
     arc_length = abs(end_angle - start_angle) * radius
     num_steps = max(1, int(arc_length / interpolation_distance))
 
     # Generate interpolated points
-    points = []
-    for step in range(num_steps + 1):
-        t = step / num_steps  # Normalized position along the arc
-        angle = start_angle + t * (end_angle - start_angle)
-        x = x_center + radius * np.cos(angle)
-        y = y_center + radius * np.sin(angle)
-        points.append((x, y))
-
-    return points
+    angles = np.linspace(start_angle, end_angle, num_steps + 1)
+    x = x_center + radius * np.cos(angles)
+    y = y_center + radius * np.sin(angles)
+    return np.stack([x, y], axis=1)
 
 def parse_gcode(file_name):
-    """Parse G-code file and extract synchronized X, Y, Z coordinates, handling both spaced and compact formats."""
-    x_coords, y_coords, z_coords = [], [], []
+    """
+    Parse G-code file and extract synchronized X, Y, Z coordinates, handling both spaced and compact formats.
+
+    Points from linear moves are appended to lists, and arcs are kept as whole arrays.
+    Both are joined into NumPy arrays once at the end.
+    """
+    x_coords, y_coords, z_coords = [], [], []  # Linear move points since the last arc
+    x_chunks, y_chunks, z_chunks = [], [], []  # Completed runs of points, as arrays
     x = y = z = None  # Initialize coordinates to track the previous values
 
     # Regular expression for extracting commands and parameters
@@ -102,35 +132,87 @@ def parse_gcode(file_name):
             elif command in (2, 3):  # G2 for CW and G3 for CCW
                 x = x_end if x_end is not None else x
                 y = y_end if y_end is not None else y
-                arc_points = generate_arc_points(
-                    x, y, x_end, y_end, x + i_offset, y + j_offset,
-                    clockwise=(command == 2)
-                )
-                for point in arc_points:
-                    x_coords.append(point[0])
-                    y_coords.append(point[1])
-                    z_coords.append(z_end if z_end is not None else z)
-
-    return x_coords, y_coords, z_coords
+                arc_z = z_end if z_end is not None else z
+                if x is not None and y is not None and arc_z is not None:
+                    arc_points = generate_arc_points(
+                        x, y, x_end, y_end, x + i_offset, y + j_offset,
+                        clockwise=(command == 2)
+                    )
+
+                    # Move the points so far into the chunks to keep them in order
+                    x_chunks += [np.array(x_coords, dtype=np.float64), arc_points[:, 0]]
+                    y_chunks += [np.array(y_coords, dtype=np.float64), arc_points[:, 1]]
+                    z_chunks += [np.array(z_coords, dtype=np.float64),
+                                 np.full(len(arc_points), arc_z, dtype=np.float64)]
+                    x_coords, y_coords, z_coords = [], [], []
+
+    x_chunks.append(np.array(x_coords, dtype=np.float64))
+    y_chunks.append(np.array(y_coords, dtype=np.float64))
+    z_chunks.append(np.array(z_coords, dtype=np.float64))
+    return np.concatenate(x_chunks), np.concatenate(y_chunks), np.concatenate(z_chunks)
 
 def initialize_tool(tool_diameter_mm, px2mm, tool_length_mm=38):
     """Create a NumPy array to represent the tool's shape, with the bottom at zero."""
     tool_radius_px = int((tool_diameter_mm / 2) * px2mm)
     tool_size = 2 * tool_radius_px + 1
+    tool_radius_mm = tool_diameter_mm / 2
+
+    # Squared distance of every tool cell from the centre, using broadcast
+    # (N, 1) and (1, N) index arrays rather than a per-pixel loop
+    ii, jj = np.ogrid[-tool_radius_px:tool_radius_px + 1, -tool_radius_px:tool_radius_px + 1]
+    dist2_mm = (ii * ii + jj * jj).astype(np.float32) / (px2mm * px2mm)
+
+    # Populate the cutting area of the tool with the ball-end profile
     tool = np.full((tool_size, tool_size), tool_length_mm, dtype=np.float32)  # Default to tool length
+    cutting = dist2_mm <= tool_radius_mm**2
+    tool[cutting] = tool_radius_mm - np.sqrt(tool_radius_mm**2 - dist2_mm[cutting])
+    return tool
 
-    # Populate the cutting area of the tool
-    for i in range(tool_size):
-        for j in range(tool_size):
-            dx = i - tool_radius_px
-            dy = j - tool_radius_px
-            distance = np.sqrt(dx**2 + dy**2) / px2mm
-            if distance <= (tool_diameter_mm / 2):
-                # Use radius minus depth for the ball-end profile
-                depth = np.sqrt((tool_diameter_mm / 2)**2 - distance**2)
-                tool[i, j] = tool_diameter_mm / 2.0 - depth
+@functools.lru_cache(maxsize=None)
+def load_tool(tool_diameter_mm, px2mm, tool_length_mm=38, cache_dir=os.path.expanduser("~/.cache/nc2image")):
+    """
+    Return initialize_tool's array, read-only, computing it once per process for each
+    tool and resolution. Large tools, which are slow to compute, are also saved in
+    cache_dir and reused by later runs.
+    """
+    tool_size = 2 * int((tool_diameter_mm / 2) * px2mm) + 1
+    if tool_size < TOOL_CACHE_MIN_SIZE:
+        tool = initialize_tool(tool_diameter_mm, px2mm, tool_length_mm)
+    else:
+        tool = load_cached_tool(tool_diameter_mm, px2mm, tool_length_mm, tool_size, cache_dir)
+    tool.flags.writeable = False
+    return tool
+
+def load_cached_tool(tool_diameter_mm, px2mm, tool_length_mm, tool_size, cache_dir):
+    """Return initialize_tool's array from cache_dir, computing and saving it if it isn't there."""
+    key = (TOOL_CACHE_VERSION, tool_diameter_mm, px2mm, tool_length_mm)
+    cache_file = os.path.join(cache_dir, f"tool_{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.npy")
+    try:
+        tool = np.load(cache_file)
+        if tool.dtype == np.float32 and tool.shape == (tool_size, tool_size):
+            return tool
+    except (OSError, ValueError):
+        pass
+
+    tool = initialize_tool(tool_diameter_mm, px2mm, tool_length_mm)
+
+    # Save for next time, writing to a temporary file first so another run never
+    # sees a partly written one. Carry on without the cache if it can't be written
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as file:
+            np.save(file, tool)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        pass
     return tool
 
+def to_fixed_point(heights_mm, scale):
+    """Convert heights in mm to int16 steps of 1/scale mm, saturating at the int16 limits."""
+    info = np.iinfo(np.int16)
+    return np.clip(np.rint(heights_mm * scale), info.min, info.max).astype(np.int16)
+
 def apply_tool(material, tool, x_px, y_px, z_value):
     """
     Apply the tool array to the material array at the specified position and Z height,
@@ -158,6 +240,208 @@ def apply_tool(material, tool, x_px, y_px, z_value):
     # Apply the minimum operation
     material[x_start:x_end, y_start:y_end] = np.minimum(material_subarray, tool_subarray)
 
+@njit(parallel=True, fastmath=True, cache=True)
+def stamp_interior(material, tool, xs_px, ys_px, zs, row_offsets):
+    """
+    Apply the tool to the material at every sample point, compiled with Numba.
+
+    Does the same as calling apply_tool for each (xs_px, ys_px, zs) sample, but the
+    whole tool must fit inside the material at every sample so nothing is clipped.
+    The samples must be sorted into tiles by sort_samples_by_tile, with row_offsets
+    giving where each row of tiles starts. A tile is at least as big as the tool,
+    so the tool can only reach into the next row of tiles. The even rows are
+    processed in parallel, then the odd rows, so no two threads write the same pixel.
+    """
+    tool_size = tool.shape[0]
+    half_tool = tool_size // 2
+    n_tile_rows = len(row_offsets) - 1
+
+    for parity in range(2):
+        for r in prange((n_tile_rows - parity + 1) // 2):
+            tile_row = 2 * r + parity
+            for k in range(row_offsets[tile_row], row_offsets[tile_row + 1]):
+                x_start = xs_px[k] - half_tool
+                y_start = ys_px[k] - half_tool
+
+                # Add in int32 so a saturated tool height can't overflow. The rows
+                # are taken outside the inner loop so it walks both arrays with
+                # stride 1, which lets LLVM vectorize it
+                z_value = np.int32(zs[k])
+                for i in range(tool_size):
+                    row = material[x_start + i, y_start:y_start + tool_size]
+                    tool_row = tool[i]
+                    for j in range(tool_size):
+                        row[j] = min(row[j], np.int32(tool_row[j]) + z_value)
+
+@njit(fastmath=True, cache=True)
+def stamp_boundary(material, tool, xs_px, ys_px, zs):
+    """
+    Apply the tool at sample points near the edge of the material, compiled with Numba.
+
+    Like stamp_interior but clips the tool to the material. There are normally few
+    or no such samples, so they are processed in order on one thread.
+    """
+    width, height = material.shape
+    half_tool = tool.shape[0] // 2
+
+    for k in range(len(zs)):
+        x_px = xs_px[k]
+        y_px = ys_px[k]
+
+        # Clip the tool footprint to the material
+        x_start = max(0, x_px - half_tool)
+        x_end = min(width, x_px + half_tool + 1)
+        y_start = max(0, y_px - half_tool)
+        y_end = min(height, y_px + half_tool + 1)
+
+        z_value = np.int32(zs[k])
+        for i in range(x_start, x_end):
+            ti = i - x_px + half_tool
+            for j in range(y_start, y_end):
+                v = np.int32(tool[ti, j - y_px + half_tool]) + z_value
+                if v < material[i, j]:
+                    material[i, j] = v
+
+# CUDA kernel for stamp_gpu. Each block applies the tool at one sample, with its
+# threads striding over the tool; atomicMin keeps overlapping samples correct.
+GPU_STAMP_SOURCE = r'''
+extern "C" __global__
+void stamp(const short* tool, int tool_size, int width, int height,
+           const int* xs_px, const int* ys_px, const int* zs, int n, int* material)
+{
+    int k = blockIdx.x;
+    if (k >= n) return;
+    int half_tool = tool_size / 2;
+    int x_px = xs_px[k];
+    int y_px = ys_px[k];
+    int z_value = zs[k];
+
+    for (int i = threadIdx.y; i < tool_size; i += blockDim.y) {
+        int mi = x_px - half_tool + i;
+        if (mi < 0 || mi >= width) continue;
+        for (int j = threadIdx.x; j < tool_size; j += blockDim.x) {
+            int mj = y_px - half_tool + j;
+            if (mj < 0 || mj >= height) continue;
+            int v = tool[i * tool_size + j] + z_value;
+            int* m = &material[mi * height + mj];
+            if (v < *m) atomicMin(m, v);
+        }
+    }
+}
+'''
+
+def stamp_gpu(material, tool, xs_px, ys_px, zs):
+    """
+    Apply the tool to the material at every sample point on the GPU, using CuPy.
+
+    Does the same as calling apply_tool for each (xs_px, ys_px, zs) sample. The
+    material is held as int32 on the GPU, as atomicMin has no 16-bit version,
+    and copied back into the int16 material at the end.
+    """
+    if len(zs) == 0:
+        return
+    width, height = material.shape
+    tool_size = tool.shape[0]
+    kernel = cupy.RawKernel(GPU_STAMP_SOURCE, 'stamp')
+
+    material_gpu = cupy.asarray(material, dtype=cupy.int32)
+    kernel(
+        (len(zs),), (16, 16),
+        (cupy.asarray(tool, dtype=cupy.int16), np.int32(tool_size), np.int32(width), np.int32(height),
+         cupy.asarray(xs_px, dtype=cupy.int32), cupy.asarray(ys_px, dtype=cupy.int32),
+         cupy.asarray(zs, dtype=cupy.int32), np.int32(len(zs)), material_gpu)
+    )
+    material[:] = cupy.asnumpy(material_gpu)
+
+# Use the Cython build of the interior and boundary kernels instead if it has been
+# compiled (see _stamp.pyx), which saves Numba's JIT compile on every run
+try:
+    from _stamp import stamp_interior, stamp_boundary
+    have_stamp_kernels = True
+except ImportError:
+    have_stamp_kernels = numba is not None
+
+def interpolate_toolpath(x_coords, y_coords, z_coords, step_mm, px2mm):
+    """
+    Expand the toolpath into evenly spaced sample points, roughly step_mm apart.
+
+    Each segment is split into max(1, int(length / step_mm)) steps and sampled at
+    both ends, so every segment contributes steps + 1 points. The steps are never
+    shorter than one pixel along the segment's longer axis, like a DDA line walk,
+    so a step_mm finer than the resolution doesn't stamp the same pixels repeatedly.
+    All segments are expanded at once with NumPy rather than point by point in Python.
+
+    Returns:
+        Three arrays (x, y, z) of the sample positions in mm.
+    """
+    dx, dy, dz = np.diff(x_coords), np.diff(y_coords), np.diff(z_coords)
+
+    # Number of steps per segment, and where each segment starts in the output
+    distance = np.sqrt(dx**2 + dy**2)
+    pixel_steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy)) * px2mm).astype(np.int64)
+    steps = np.maximum(1, np.minimum((distance / step_mm).astype(np.int64), pixel_steps))
+    offsets = np.concatenate(([0], np.cumsum(steps + 1)))
+
+    # Segment index and normalized position t for every sample
+    idx = np.arange(offsets[-1])
+    seg = np.searchsorted(offsets, idx, side='right') - 1
+    t = (idx - offsets[seg]) / steps[seg]
+
+    xs = x_coords[seg] + t * dx[seg]
+    ys = y_coords[seg] + t * dy[seg]
+    zs = z_coords[seg] + t * dz[seg]
+    return xs, ys, zs
+
+def merge_duplicate_samples(xs_px, ys_px, zs, height):
+    """
+    Reduce the samples to one per pixel, keeping the lowest Z.
+
+    The step is usually smaller than a pixel, so neighbouring samples often land on
+    the same pixel. Only the lowest of those can cut anything, so the others are
+    dropped before the tool is applied.
+    """
+    if len(zs) == 0:
+        return xs_px, ys_px, zs
+
+    key = xs_px.astype(np.int64) * height + ys_px
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+
+    # Start of each run of samples on the same pixel
+    starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+    first = order[starts]
+    return xs_px[first], ys_px[first], np.minimum.reduceat(zs[order], starts)
+
+def sort_samples_by_tile(xs_px, ys_px, zs, width, height, tile_px):
+    """
+    Sort the samples into square tiles of tile_px pixels, row of tiles by row of tiles.
+
+    Applying the tool to all the samples in one tile before moving on keeps the
+    part of the material being worked on in the CPU cache, rather than jumping
+    around the whole array.
+
+    Returns:
+        The sorted (xs_px, ys_px, zs), and the index of the first sample in each
+        row of tiles followed by the number of samples.
+    """
+    n_tile_rows = (width + tile_px - 1) // tile_px
+    n_tile_cols = (height + tile_px - 1) // tile_px
+    tile_row = xs_px // tile_px
+    tile_id = tile_row.astype(np.int64) * n_tile_cols + ys_px // tile_px
+    order = np.argsort(tile_id, kind='stable')
+
+    row_offsets = np.searchsorted(tile_row[order], np.arange(n_tile_rows + 1))
+    return xs_px[order], ys_px[order], zs[order], row_offsets
+
+def gridline_pixels(first_px, size_px, spacing_px, line_width):
+    """
+    Return the pixel rows (or columns) covered by gridlines line_width pixels wide,
+    spaced spacing_px apart starting at first_px, clipped to the image size.
+    """
+    centres = np.arange(first_px, size_px, spacing_px)
+    pixels = (centres[:, None] + np.arange(line_width) - line_width // 2).ravel()
+    return pixels[(pixels >= 0) & (pixels < size_px)]
+
 def create_material(gcode_file, px2mm, tool_diameter_mm, material_top_height, step_mm, output_file, grid_spacing_mm=10):
     """
     Simulate the cutting process and produce a grayscale image from the material array,
@@ -168,9 +452,9 @@ def create_material(gcode_file, px2mm, tool_diameter_mm, material_top_height, st
     print(f"Parsed {len(x_coords)} G-code lines.")  # Number of G-code lines
 
     # Determine the workspace boundaries
-    x_min, x_max = min(x_coords) - 10, max(x_coords) + 10
-    y_min, y_max = min(y_coords) - 10, max(y_coords) + 10
-    z_min, z_max = min(z_coords), max(z_coords)
+    x_min, x_max = float(x_coords.min()) - 10, float(x_coords.max()) + 10
+    y_min, y_max = float(y_coords.min()) - 10, float(y_coords.max()) + 10
+    z_min, z_max = float(z_coords.min()), float(z_coords.max())
 
     # Print ranges for debugging
     print(f"X range: {x_min:.2f} to {x_max:.2f}")
@@ -182,47 +466,82 @@ def create_material(gcode_file, px2mm, tool_diameter_mm, material_top_height, st
     height = int((y_max - y_min) * px2mm) + 1
     print(f"Image dimensions: {width} pixels wide, {height} pixels tall")
 
+    # Heights are simulated as 16-bit integers relative to the top of the material,
+    # which halves the memory traffic. The scale uses most of the int16 range for
+    # the deepest cut; anything higher saturates, which is safe as it can't cut.
+    depth = material_top_height - z_min
+    scale = 30000 / depth if depth > 0 else 1000.0
+    print(f"Height resolution: {1000 / scale:.4f} um")
+
     # Initialize the material array
-    material = np.full((width, height), material_top_height, dtype=np.float32)
+    material = np.zeros((width, height), dtype=np.int16, order='C')  # y is the fast axis
     print(f"Material initialized with top height: {material_top_height} mm")
 
     # Initialize the tool
-    tool = initialize_tool(tool_diameter_mm, px2mm)
+    tool = load_tool(tool_diameter_mm, px2mm)
     print(f"Tool diameter: {tool_diameter_mm} mm, radius in pixels: {tool.shape[0] // 2}")
+    tool = to_fixed_point(tool, scale)
+
+    # Interpolate along the toolpath and convert to pixel and height coordinates
+    xs, ys, zs = interpolate_toolpath(x_coords, y_coords, z_coords, step_mm, px2mm)
+    xs_px = ((xs - x_min) * px2mm).astype(np.int32)
+    ys_px = ((ys - y_min) * px2mm).astype(np.int32)
+    zs = to_fixed_point(zs - material_top_height, scale).astype(np.int32)
+
+    # Skip samples where even the bottom of the tool is at or above the top of the
+    # material (e.g. rapid moves), as they can't cut anything
+    cutting = zs + int(tool.min()) < 0
+    xs_px, ys_px, zs = xs_px[cutting], ys_px[cutting], zs[cutting]
+
+    xs_px, ys_px, zs = merge_duplicate_samples(xs_px, ys_px, zs, height)
+    print(f"Toolpath cuts at {len(zs)} pixels.")
 
     # Process the G-code paths
     print("Simulating the toolpath...")
-    for i in tqdm(range(1, len(x_coords))):  # Progress bar for processing
-        x1, y1, z1 = x_coords[i - 1], y_coords[i - 1], z_coords[i - 1]
-        x2, y2, z2 = x_coords[i], y_coords[i], z_coords[i]
-
-        # Interpolate along the toolpath
-        distance = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-        steps = max(1, int(distance / step_mm))
-        for step in range(steps + 1):
-            t = step / steps
-            x = x1 + t * (x2 - x1)
-            y = y1 + t * (y2 - y1)
-            z = z1 + t * (z2 - z1)
-
-            # Convert to pixel coordinates
-            x_px = int((x - x_min) * px2mm)
-            y_px = int((y - y_min) * px2mm)
-
-            # Apply the tool at this step
-            apply_tool(material, tool, x_px, y_px, z)
-
-    # Map the material heights to grayscale
-    material_grayscale = 255 * (material - z_min) / (material_top_height - z_min)
-    material_grayscale = material_grayscale.clip(0, 255).astype(np.uint8)
+    tile_px = max(256, tool.shape[0])
+    if len(zs) == 0:
+        print("The toolpath never goes below the top of the material.")
+    elif cupy is not None:
+        stamp_gpu(material, tool, xs_px, ys_px, zs)
+    elif have_stamp_kernels:
+        # Samples where the whole tool fits inside the material need no clipping
+        half_tool = tool.shape[0] // 2
+        interior = ((xs_px >= half_tool) & (xs_px < width - half_tool)
+                    & (ys_px >= half_tool) & (ys_px < height - half_tool))
+        stamp_boundary(material, tool, xs_px[~interior], ys_px[~interior], zs[~interior])
+
+        # Group the interior samples into tiles, each at least as big as the tool
+        xs_px, ys_px, zs, row_offsets = sort_samples_by_tile(
+            xs_px[interior], ys_px[interior], zs[interior], width, height, tile_px
+        )
+        stamp_interior(material, tool, xs_px, ys_px, zs, row_offsets)
+    else:
+        # Group the samples into tiles, each at least as big as the tool
+        xs_px, ys_px, zs, _ = sort_samples_by_tile(xs_px, ys_px, zs, width, height, tile_px)
 
-    # Rotate the image for correct orientation
-    material_grayscale = np.rot90(material_grayscale)
-    material_grayscale = Image.fromarray(material_grayscale)
+        # Keep z as NumPy int32 so adding it to the int16 tool can't overflow
+        samples = zip(xs_px.tolist(), ys_px.tolist(), zs)
+        for x_px, y_px, z in tqdm(samples, total=len(zs)):  # Progress bar for processing
+            apply_tool(material, tool, x_px, y_px, z)
 
-    # Create a new image for the grid (RGBA for transparency)
-    grid_image = Image.new("RGBA", material_grayscale.size, (0, 0, 0, 0))  # Transparent background
-    draw = ImageDraw.Draw(grid_image)
+    # Map the material heights to grayscale, working in place to avoid temporary
+    # arrays. Heights are in 1/scale mm from the top, so the top maps to 255 and
+    # z_min (-depth * scale) maps to 0
+    material_grayscale = material.astype(np.float32)
+    material_grayscale *= 255 / (scale * depth) if depth > 0 else 0.0
+    material_grayscale += 255
+    np.clip(material_grayscale, 0, 255, out=material_grayscale)
+
+    # Rotate the image for correct orientation (the same as np.rot90), converting to
+    # uint8 straight into the rotated image rather than making a copy to rotate
+    rotated = np.empty((height, width), dtype=np.uint8)
+    np.copyto(rotated, material_grayscale.T[::-1], casting='unsafe')
+    material_grayscale = Image.fromarray(rotated)
+
+    # Create a new array for the grid (RGBA for transparency), drawing whole sets of
+    # gridlines at once with NumPy indexing
+    width_px, height_px = material_grayscale.size
+    grid = np.zeros((height_px, width_px, 4), dtype=np.uint8)  # Transparent background
 
     # Calculate grid spacing in pixels
     grid_spacing_px = int(grid_spacing_mm * px2mm)
@@ -232,29 +551,29 @@ def create_material(gcode_file, px2mm, tool_diameter_mm, material_top_height, st
     y_offset_px = int((-y_min) * px2mm) % grid_spacing_px
 
     # Draw the gridlines
-    for x in range(x_offset_px, material_grayscale.width, grid_spacing_px):
-        draw.line([(x, 0), (x, material_grayscale.height)], fill=(0, 0, 255, 128), width=5)  # Blue, semi-transparent
-    for y in range(y_offset_px, material_grayscale.height, grid_spacing_px):
-        draw.line([(0, y), (material_grayscale.width, y)], fill=(0, 0, 255, 128), width=5)  # Blue, semi-transparent
+    blue = (0, 0, 255, 128)  # Blue, semi-transparent
+    grid[:, gridline_pixels(x_offset_px, width_px, grid_spacing_px, 5)] = blue
+    grid[gridline_pixels(y_offset_px, height_px, grid_spacing_px, 5), :] = blue
 
     # Draw finer gridlines
     grid_spacing_px = int(grid_spacing_mm / 10 * px2mm)
     x_offset_px = int((-x_min) * px2mm) % grid_spacing_px
     y_offset_px = int((-y_min) * px2mm) % grid_spacing_px
 
-    for x in range(x_offset_px, material_grayscale.width, grid_spacing_px):
-        draw.line([(x, 0), (x, material_grayscale.height)], fill=(0, 255, 0, 128), width=1)  # Green, semi-transparent
-    for y in range(y_offset_px, material_grayscale.height, grid_spacing_px):
-        draw.line([(0, y), (material_grayscale.width, y)], fill=(0, 255, 0, 128), width=1)  # Green, semi-transparent
+    green = (0, 255, 0, 128)  # Green, semi-transparent
+    grid[:, gridline_pixels(x_offset_px, width_px, grid_spacing_px, 1)] = green
+    grid[gridline_pixels(y_offset_px, height_px, grid_spacing_px, 1), :] = green
 
     # Draw red lines for x=0 and y=0
     x_zero_px = int((-x_min) * px2mm)  # Pixel position for x=0
-    y_zero_px = material_grayscale.height - int((-y_min) * px2mm) - 1  # Pixel position for y=0
-
-    if 0 <= x_zero_px < material_grayscale.width:
-        draw.line([(x_zero_px, 0), (x_zero_px, material_grayscale.height)], fill=(255, 0, 0, 255), width=5)  # Red, solid
-    if 0 <= y_zero_px < material_grayscale.height:
-        draw.line([(0, y_zero_px), (material_grayscale.width, y_zero_px)], fill=(255, 0, 0, 255), width=5)  # Red, solid
+    y_zero_px = height_px - int((-y_min) * px2mm) - 1  # Pixel position for y=0
+
+    red = (255, 0, 0, 255)  # Red, solid
+    if 0 <= x_zero_px < width_px:
+        grid[:, gridline_pixels(x_zero_px, width_px, width_px, 5)] = red
+    if 0 <= y_zero_px < height_px:
+        grid[gridline_pixels(y_zero_px, height_px, height_px, 5), :] = red
+    grid_image = Image.fromarray(grid, "RGBA")
 
     # Combine the material and grid images
     combined_image = Image.alpha_composite(